@@ -1,18 +1,109 @@
+if __name__ == "__main__":
+    try:
+        from gevent import monkey
+
+        monkey.patch_all()
+    except ImportError:
+        pass
+
 import os
+import re
+import time
+import hashlib
+import functools
+import itertools
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+from collections import OrderedDict
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    has_request_context,
+    request,
+    jsonify,
+    send_from_directory,
+)
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
+import msgspec
+import orjson
 from models.flashcard import FlashcardGenerator
+from models.schemas import (
+    BulkSaveFlashcardsRequest,
+    GenerateFlashcardsRequest,
+    PaymentIntentRequest,
+    PremiumValidationRequest,
+    SaveFlashcardsRequest,
+)
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import secrets
 import uuid
-import random
+
+try:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+except ImportError:
+    pass
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class ORJSONProvider(JSONProvider):
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding to
+        # str and letting Werkzeug re-encode it
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self.dumps_bytes(obj), mimetype="application/json"
+        )
+
+
 app = Flask(__name__, static_folder="../frontend", static_url_path="")
+app.json = ORJSONProvider(app)
+
+app.config["COMPRESS_MIMETYPES"] = [
+    "application/json",
+    "text/html",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "image/svg+xml",
+]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = 1024
+# Pinned so a Flask-Compress upgrade cannot silently change per-response CPU cost
+app.config["COMPRESS_LEVEL"] = 6
+app.config["COMPRESS_BR_LEVEL"] = 4
+Compress(app)
+
+
+def etag_matches(etag):
+    # Flask-Compress appends ":br"/":gzip" to the ETag of compressed responses
+    return any(tag.partition(":")[0] == etag for tag in request.if_none_match)
+
 
 if os.environ.get("FLASK_ENV") == "development":
     CORS(app)
@@ -29,98 +120,425 @@ INTASEND_PUBLISHABLE_KEY = os.getenv("INTASEND_PUBLISHABLE_KEY")
 INTASEND_SECRET_KEY = os.getenv("INTASEND_SECRET_KEY")
 INTASEND_BASE_URL = os.getenv("INTASEND_BASE_URL", "https://sandbox.intasend.com")
 
-USE_SUPABASE = bool(os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"))
-supabase = None
-if USE_SUPABASE:
+# Keep-alive pool for IntaSend. Every call is a POST without an idempotency
+# key, so only failed connects (request never sent) are retried; 5xx and read
+# errors are returned to the caller rather than risking a duplicate collection
+intasend_session = requests.Session()
+intasend_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, read=0, backoff_factor=0.3),
+    ),
+)
+
+AI_ENABLED = bool(os.getenv("GEMINI_API_KEY"))
+
+
+SUPABASE_TIMEOUT_SECONDS = 30
+SUPABASE_CONNECT_TIMEOUT_SECONDS = 5
+
+
+def build_postgrest_session(base_url, headers, timeout):
+    import httpx
+    from postgrest.utils import SyncClient
+
     try:
-        from supabase.client import create_client, Client
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        if supabase_url is not None and supabase_key is not None:
-            supabase = create_client(supabase_url, supabase_key)
-            logger.info("Supabase client initialized")
-        else:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set and not None")
+        import h2  # noqa: F401
+
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    # HTTP/2 multiplexes concurrent queries over one TLS connection; httpx
+    # retires idle sockets after keepalive_expiry, so no manual recycling
+    return SyncClient(
+        base_url=base_url,
+        headers=headers,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=20,
+            max_keepalive_connections=20,
+            keepalive_expiry=60,
+        ),
+        timeout=timeout,
+    )
+
+
+def create_pooled_supabase_client(supabase_url, supabase_key):
+    import httpx
+    from postgrest import SyncPostgrestClient
+    from supabase.client import Client, ClientOptions
+
+    class PooledPostgrestClient(SyncPostgrestClient):
+        def create_session(self, base_url, headers, timeout):
+            return build_postgrest_session(base_url, headers, timeout)
+
+    class PooledClient(Client):
+        # supabase drops its PostgREST client on every auth event and rebuilds
+        # it through this hook, so the tuned pool survives token refreshes
+        @staticmethod
+        def _init_postgrest_client(rest_url, headers, schema, timeout=None):
+            return PooledPostgrestClient(
+                rest_url, headers=headers, schema=schema, timeout=timeout
+            )
+
+    options = ClientOptions(
+        postgrest_client_timeout=httpx.Timeout(
+            SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS
+        )
+    )
+    return PooledClient.create(supabase_url, supabase_key, options)
+
+
+@functools.lru_cache(maxsize=1)
+def get_supabase():
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+    if not (supabase_url and supabase_key):
+        return None
+
+    try:
+        client = create_pooled_supabase_client(supabase_url, supabase_key)
+        logger.info("Supabase client initialized")
+        return client
     except Exception as e:
-        logger.error(f"Supabase init failed: {e}")
-        USE_SUPABASE = False
-        supabase = None
-else:
+        logger.error("Supabase init failed: %s", e)
+        return None
+
+
+USE_SUPABASE = get_supabase() is not None
+if not USE_SUPABASE:
     logger.info("Using in-memory storage")
 
+STORAGE_LABEL = "Supabase" if USE_SUPABASE else "Memory"
+
 flashcard_storage = {}
-storage_counter = 1
+flashcard_ids = itertools.count(1)
 payment_storage = {}
-payment_counter = 1
+payment_ids = itertools.count(1)
+
+# The memory fallback is meant for development; cap it so a long-running
+# instance without Supabase cannot grow without bound
+MAX_MEMORY_SETS = 10_000
+MAX_MEMORY_PAYMENTS = 50_000
+
+
+def evict_oldest(storage, limit, label):
+    # Dicts keep insertion order, so the first key is the oldest entry; FIFO
+    # rather than LRU so flashcard_storage stays in creation order
+    evicted = 0
+    while len(storage) > limit:
+        del storage[next(iter(storage))]
+        evicted += 1
+    if evicted:
+        logger.warning(
+            "Memory storage full, evicted %s oldest %s; configure Supabase",
+            evicted,
+            label,
+        )
+
+
+payment_rpc_available = True
+
+FINAL_PAYMENT_STATUSES = {"completed", "failed", "cancelled"}
+PAYMENT_CACHE_SIZE = 4096
+_payment_cache = {}
+
+MAX_BULK_SETS = 100
+MAX_LIST_LIMIT = 100
+
+SET_SUMMARY_COLUMNS = "id, title, total_cards, created_at, tier_required, user_email"
+SET_DETAIL_COLUMNS = SET_SUMMARY_COLUMNS + ", flashcards, card_statuses"
+
+LIST_CACHE_TTL = 30
+LIST_CACHE_SIZE = 1024
+_list_cache = OrderedDict()
+_cache_version = 0
+_cache_lock = threading.RLock()
+
+TIER_CACHE_TTL = 60
+# Most lookups are for free users; upgrades invalidate explicitly, so "free"
+# can be trusted for longer than "premium" (which can expire)
+FREE_TIER_CACHE_TTL = 300
+TIER_CACHE_SIZE = 4096
+_tier_cache = {}
+
+
+def coerce_id(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def request_cached(fn):
+    # Memoize for the rest of the current request; outside one, call through
+    @functools.wraps(fn)
+    def wrapper(*args):
+        if not has_request_context():
+            return fn(*args)
+        cache = g.setdefault("_request_cache", {})
+        key = (fn.__name__, *args)
+        if key not in cache:
+            cache[key] = fn(*args)
+        return cache[key]
+
+    return wrapper
+
+
+def clear_request_cache():
+    if has_request_context():
+        g.pop("_request_cache", None)
+
+
+def bump_cache_version():
+    global _cache_version
+    with _cache_lock:
+        _cache_version += 1
+        _list_cache.clear()
+
+
+_timestamp_cache = [0, ""]
+
+
+def now_iso():
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        _timestamp_cache[:] = [now, datetime.fromtimestamp(now).isoformat()]
+    return _timestamp_cache[1]
+
+
+def cache_window():
+    return int(time.monotonic() // LIST_CACHE_TTL)
+
+
+MAX_REQUEST_BYTES = 256 * 1024
+# Also enforced by Werkzeug while reading, which covers chunked bodies that
+# carry no Content-Length
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+MAX_TEXT_CHARS = 50000
+
+
+def read_request_body():
+    if request.content_length and request.content_length > MAX_REQUEST_BYTES:
+        abort(413)
+    return request.get_data(cache=False)
+
+
+def read_json():
+    body = read_request_body()
+    if not body:
+        return None
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def parse_request(schema):
+    body = read_request_body()
+    if not body:
+        return None, (jsonify({"error": "No data provided"}), 400)
+    try:
+        return msgspec.json.decode(body, type=schema), None
+    except msgspec.ValidationError as e:
+        return None, (jsonify({"error": f"Invalid request: {e}"}), 400)
+    except msgspec.DecodeError:
+        return None, (jsonify({"error": "Invalid JSON"}), 400)
+
+
+class GenerationBatcher:
+    """Collects concurrent generate requests and dispatches them together.
+
+    Each batch is fanned out with one Gemini request per material (see
+    FlashcardGenerator.generate_batch); max_batch matches the Gemini
+    session's pool size.
+    """
+
+    def __init__(self, max_batch=8, max_wait=0.05, timeout=70, processes=0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.processes = processes
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._executor = None
+
+    def submit(self, text, num_cards):
+        slot = {"done": threading.Event(), "flashcards": []}
+        with self._lock:
+            self._pending.append((time.monotonic(), text, num_cards, slot))
+            if self._worker is None:
+                # Started lazily so each forked gunicorn worker gets its own thread
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        self._wakeup.set()
+
+        if not slot["done"].wait(self.timeout):
+            logger.error("Timed out waiting for batched flashcard generation")
+        return slot["flashcards"]
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._pending:
+                    self._wakeup.clear()
+                    continue
+                waited = time.monotonic() - self._pending[0][0]
+                if len(self._pending) < self.max_batch and waited < self.max_wait:
+                    batch = None
+                else:
+                    batch = self._pending[: self.max_batch]
+                    del self._pending[: self.max_batch]
+
+            if batch is None:
+                time.sleep(self.max_wait - waited)
+                continue
+
+            threading.Thread(target=self._dispatch, args=(batch,), daemon=True).start()
+
+    def _generate(self, items):
+        if not self.processes:
+            return FlashcardGenerator.generate_batch(items)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            executor = self._executor
+        try:
+            future = executor.submit(FlashcardGenerator.generate_batch, items)
+            # A timeout only abandons the result; the child keeps generating
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            # A dead child (e.g. OOM-killed) breaks the pool for good; replace it
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            logger.error("Generation process pool broke; starting a new one")
+            raise
+
+    def _dispatch(self, batch):
+        try:
+            results = self._generate(
+                [(text, num_cards) for _, text, num_cards, _ in batch]
+            )
+        except Exception as e:
+            logger.error("Batched flashcard generation failed: %s", e)
+            results = [[] for _ in batch]
+
+        for (_, _, _, slot), flashcards in zip(batch, results):
+            slot["flashcards"] = flashcards
+            slot["done"].set()
+
+
+# Pattern-based generation is pure-Python CPU work; set GENERATION_PROCESSES to
+# run it outside the GIL of the serving process (best left at 0 under gevent)
+generation_batcher = GenerationBatcher(
+    processes=int(os.getenv("GENERATION_PROCESSES", 0))
+)
+
+GENERATION_CACHE_SIZE = 128
+GENERATION_CACHE_TTL = 600
+_generation_cache = OrderedDict()
+_generation_inflight = {}
+_generation_cache_lock = threading.Lock()
+
+
+def generate_flashcards_cached(text, num_cards):
+    key = (hashlib.blake2b(text.encode(), digest_size=16).digest(), num_cards)
+    with _generation_cache_lock:
+        cached = _generation_cache.get(key)
+        if cached is not None:
+            if time.monotonic() - cached[0] < GENERATION_CACHE_TTL:
+                _generation_cache.move_to_end(key)
+                return cached[1]
+            del _generation_cache[key]
+
+        # Identical requests already being generated share that result
+        inflight = _generation_inflight.get(key)
+        if inflight is None:
+            future = _generation_inflight[key] = Future()
+
+    if inflight is not None:
+        try:
+            return inflight.result(timeout=generation_batcher.timeout)
+        except FutureTimeoutError:
+            return []
+
+    flashcards = []
+    try:
+        flashcards = generation_batcher.submit(text, num_cards)
+    finally:
+        with _generation_cache_lock:
+            del _generation_inflight[key]
+            if flashcards:
+                _generation_cache[key] = (time.monotonic(), flashcards)
+                if len(_generation_cache) > GENERATION_CACHE_SIZE:
+                    _generation_cache.popitem(last=False)
+        future.set_result(flashcards)
+    return flashcards
 
 
 class TierManager:
     @staticmethod
+    @request_cached
     def check_user_tier(user_email):
         if not user_email:
             return "free"
 
-        if USE_SUPABASE and supabase:
+        supabase = get_supabase()
+        if supabase:
+            cached = _tier_cache.get(user_email)
+            if cached:
+                ttl = FREE_TIER_CACHE_TTL if cached[1] == "free" else TIER_CACHE_TTL
+                if time.monotonic() - cached[0] < ttl:
+                    return cached[1]
             try:
-                result = (
-                    supabase.table("premium_users")
-                    .select("*")
-                    .eq("user_email", user_email)
-                    .eq("is_active", True)
-                    .execute()
-                )
-
-                if result.data and len(result.data) > 0:
-                    subscription = result.data[0]
-                    expires_at = datetime.fromisoformat(
-                        subscription["expires_at"].replace("Z", "+00:00")
-                    )
-                    if expires_at > datetime.now():
-                        return "premium"
-                    else:
-                        supabase.table("premium_users").update({"is_active": False}).eq(
-                            "user_email", user_email
-                        ).execute()
-
-                return "free"
+                tier = TierManager._fetch_user_tier(supabase, user_email)
             except Exception as e:
-                logger.error(f"Tier check failed: {e}")
+                logger.error("Tier check failed: %s", e)
                 return "free"
+            if len(_tier_cache) >= TIER_CACHE_SIZE:
+                _tier_cache.clear()
+            _tier_cache[user_email] = (time.monotonic(), tier)
+            return tier
         return "free"
 
     @staticmethod
-    def can_access_flashcard_set(user_email, set_id):
-        if USE_SUPABASE and supabase:
-            try:
-                result = (
-                    supabase.table("flashcard_sets")
-                    .select("tier_required, user_email")
-                    .eq("id", set_id)
-                    .execute()
-                )
-
-                if not result.data:
-                    return False
-
-                flashcard_set = result.data[0]
-                tier_required = flashcard_set.get("tier_required", "free")
-
-                if tier_required == "free":
-                    return True
+    def _fetch_user_tier(supabase, user_email):
+        result = (
+            supabase.table("premium_users")
+            .select("*")
+            .eq("user_email", user_email)
+            .eq("is_active", True)
+            .execute()
+        )
 
-                if tier_required == "premium":
-                    user_tier = TierManager.check_user_tier(user_email)
-                    return user_tier == "premium"
+        if result.data and len(result.data) > 0:
+            subscription = result.data[0]
+            expires_at = datetime.fromisoformat(
+                subscription["expires_at"].replace("Z", "+00:00")
+            )
+            if expires_at > datetime.now():
+                return "premium"
+            else:
+                supabase.table("premium_users").update({"is_active": False}).eq(
+                    "user_email", user_email
+                ).execute()
 
-                return False
-            except Exception as e:
-                logger.error(f"Access check failed: {e}")
-                return False
-        return True
+        return "free"
 
     @staticmethod
     def create_premium_subscription(user_email, plan_type, payment_id):
-        if USE_SUPABASE and supabase:
+        supabase = get_supabase()
+        if supabase:
             try:
                 expires_at = datetime.now() + (
                     timedelta(days=365) if plan_type == "yearly" else timedelta(days=30)
@@ -139,9 +557,12 @@ class TierManager:
                     .upsert(subscription_data, on_conflict="user_email")
                     .execute()
                 )
+                _tier_cache.pop(user_email, None)
+                bump_cache_version()
+                clear_request_cache()
                 return result.data[0] if result.data else None
             except Exception as e:
-                logger.error(f"Premium subscription creation failed: {e}")
+                logger.error("Premium subscription creation failed: %s", e)
                 return None
         return None
 
@@ -151,21 +572,39 @@ class PaymentStorage:
     def create_payment_intent(
         amount, currency, description, user_email=None, plan_type="monthly"
     ):
-        timestamp = int(datetime.now().timestamp() * 1000) + random.randint(0, 999)
+        return PaymentStorage.save_payment_intent(
+            PaymentStorage.build_payment_intent(
+                amount, currency, description, user_email, plan_type
+            )
+        )
+
+    @staticmethod
+    def build_payment_intent(
+        amount, currency, description, user_email=None, plan_type="monthly"
+    ):
+        now = datetime.now(timezone.utc)
 
-        payment_intent = {
+        return {
             "amount": amount,
             "currency": currency,
             "description": description,
             "user_email": user_email,
             "plan_type": plan_type,
             "status": "pending",
-            "created_at": datetime.now().isoformat(),
-            "expires_at": (datetime.now() + timedelta(hours=1)).isoformat(),
-            "reference": f"studypal_{timestamp}_{secrets.token_urlsafe(8)}",
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(hours=1)).isoformat(),
+            "reference": f"studypal_{secrets.token_urlsafe(16)}",
         }
 
-        if USE_SUPABASE and supabase:
+    @staticmethod
+    def save_payment_intent(payment_intent):
+        user_email = payment_intent["user_email"]
+        supabase = get_supabase()
+        if supabase:
+            saved = PaymentStorage._save_via_rpc(supabase, payment_intent)
+            if saved:
+                return saved
+
             try:
                 existing = (
                     supabase.table("payment_intents")
@@ -187,7 +626,7 @@ class PaymentStorage:
                             datetime.now(created_at.tzinfo) - created_at
                         ).total_seconds() < 300:
                             logger.info(
-                                f"Returning existing payment intent for {user_email}"
+                                "Returning existing payment intent for %s", user_email
                             )
                             return recent
                     except:
@@ -197,18 +636,19 @@ class PaymentStorage:
                     supabase.table("payment_intents").insert(payment_intent).execute()
                 )
                 if result.data:
-                    logger.info(f"Created new payment intent for {user_email}")
+                    logger.info("Created new payment intent for %s", user_email)
                     return result.data[0]
 
             except Exception as e:
-                logger.error(f"Supabase payment save failed: {e}")
+                logger.error("Supabase payment save failed: %s", e)
 
-                if "23505" in str(e):
+                # postgrest's APIError carries the Postgres SQLSTATE as .code
+                if getattr(e, "code", None) == "23505":
                     try:
                         logger.info("Retrying with UUID due to duplicate key error")
                         payment_intent["id"] = str(uuid.uuid4())
                         payment_intent["reference"] = (
-                            f"studypal_uuid_{uuid.uuid4().hex[:8]}_{secrets.token_urlsafe(4)}"
+                            f"studypal_{secrets.token_urlsafe(16)}"
                         )
 
                         result = (
@@ -219,31 +659,56 @@ class PaymentStorage:
                         if result.data:
                             return result.data[0]
                     except Exception as retry_error:
-                        logger.error(f"UUID retry also failed: {retry_error}")
-
-        global payment_counter
-        payment_intent["id"] = payment_counter
-        payment_storage[payment_counter] = payment_intent
-        payment_counter += 1
-        logger.info(
-            f"Saved payment intent to memory storage with ID {payment_counter-1}"
-        )
+                        logger.error("UUID retry also failed: %s", retry_error)
+
+        payment_id = next(payment_ids)
+        payment_intent["id"] = payment_id
+        payment_storage[payment_id] = payment_intent
+        evict_oldest(payment_storage, MAX_MEMORY_PAYMENTS, "payment intents")
+        logger.info("Saved payment intent to memory storage with ID %s", payment_id)
         return payment_intent
 
+    @staticmethod
+    def _save_via_rpc(supabase, payment_intent):
+        # reuse_or_create_payment_intent (see README) does the recent-pending
+        # check and the insert in one round trip
+        global payment_rpc_available
+        if not payment_rpc_available:
+            return None
+        try:
+            result = supabase.rpc(
+                "reuse_or_create_payment_intent", {"intent": payment_intent}
+            ).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            if getattr(e, "code", None) == "PGRST202":
+                logger.info("Payment intent RPC not installed, using select + insert")
+                payment_rpc_available = False
+            else:
+                logger.error("Payment intent RPC failed: %s", e)
+            return None
+
     @staticmethod
     def update_payment_status(payment_id, status, intasend_ref=None):
         update_data = {"status": status, "updated_at": datetime.now().isoformat()}
         if intasend_ref:
             update_data["intasend_reference"] = intasend_ref
 
-        if USE_SUPABASE and supabase:
+        supabase = get_supabase()
+        if supabase:
             try:
-                supabase.table("payment_intents").update(update_data).eq(
-                    "id", payment_id
-                ).execute()
+                # PostgREST returns the updated row, so no follow-up select
+                result = (
+                    supabase.table("payment_intents")
+                    .update(update_data)
+                    .eq("id", payment_id)
+                    .execute()
+                )
+                payment = result.data[0] if result.data else None
+                if payment:
+                    PaymentStorage._remember_payment(payment)
 
                 if status == "completed":
-                    payment = PaymentStorage.get_payment_intent(payment_id)
                     if payment and payment.get("user_email"):
                         TierManager.create_premium_subscription(
                             payment["user_email"],
@@ -253,15 +718,15 @@ class PaymentStorage:
 
                 return True
             except Exception as e:
-                logger.error(f"Supabase payment update failed: {e}")
+                logger.error("Supabase payment update failed: %s", e)
 
-        if int(payment_id) in payment_storage:
-            payment_storage[int(payment_id)].update(update_data)
+        payment = payment_storage.get(coerce_id(payment_id))
+        if payment is not None:
+            payment.update(update_data)
 
             if status == "completed":
-                payment = payment_storage[int(payment_id)]
                 logger.info(
-                    f"Payment {payment_id} completed for {payment.get('user_email')}"
+                    "Payment %s completed for %s", payment_id, payment.get("user_email")
                 )
 
             return True
@@ -269,7 +734,11 @@ class PaymentStorage:
 
     @staticmethod
     def get_payment_intent(payment_id):
-        if USE_SUPABASE and supabase:
+        supabase = get_supabase()
+        if supabase:
+            cached = _payment_cache.get(PaymentStorage._cache_key(payment_id))
+            if cached is not None:
+                return cached
             try:
                 result = (
                     supabase.table("payment_intents")
@@ -278,10 +747,26 @@ class PaymentStorage:
                     .execute()
                 )
                 if result.data and len(result.data) > 0:
+                    PaymentStorage._remember_payment(result.data[0])
                     return result.data[0]
             except Exception as e:
-                logger.error(f"Supabase payment fetch failed: {e}")
-        return payment_storage.get(int(payment_id))
+                logger.error("Supabase payment fetch failed: %s", e)
+        return payment_storage.get(coerce_id(payment_id))
+
+    @staticmethod
+    def _cache_key(payment_id):
+        key = coerce_id(payment_id)
+        return key if key is not None else str(payment_id)
+
+    @staticmethod
+    def _remember_payment(payment):
+        # Only settled payments are cached: a pending row may be updated by a
+        # webhook handled in another worker while the client polls its status
+        if payment.get("status") not in FINAL_PAYMENT_STATUSES:
+            return
+        if len(_payment_cache) >= PAYMENT_CACHE_SIZE:
+            _payment_cache.clear()
+        _payment_cache[PaymentStorage._cache_key(payment["id"])] = payment
 
 
 class FlashcardStorage:
@@ -294,166 +779,265 @@ class FlashcardStorage:
         user_email=None,
         tier_required="free",
     ):
-        global storage_counter
-        total_cards = len(flashcards) if flashcards else 0
-        flashcard_set = {
+        flashcard_set = FlashcardStorage.build_flashcard_set(
+            title, flashcards, original_text, card_statuses, user_email, tier_required
+        )
+
+        supabase = get_supabase()
+        if supabase:
+            try:
+                result = (
+                    supabase.table("flashcard_sets").insert(flashcard_set).execute()
+                )
+                if result.data:
+                    bump_cache_version()
+                    return result.data[0]
+                return FlashcardStorage._save_to_memory(flashcard_set)
+            except Exception as e:
+                logger.error("Supabase save failed: %s", e)
+                return FlashcardStorage._save_to_memory(flashcard_set)
+        else:
+            return FlashcardStorage._save_to_memory(flashcard_set)
+
+    @staticmethod
+    def build_flashcard_set(
+        title,
+        flashcards,
+        original_text,
+        card_statuses=None,
+        user_email=None,
+        tier_required="free",
+    ):
+        return {
             "title": title,
             "flashcards": flashcards,
             "original_text": original_text,
             "card_statuses": card_statuses or [],
             "created_at": datetime.now().isoformat(),
-            "total_cards": total_cards,
+            "total_cards": len(flashcards) if flashcards else 0,
             "tier_required": tier_required,
             "user_email": user_email,
         }
 
-        if USE_SUPABASE and supabase:
+    @staticmethod
+    def save_many(flashcard_sets):
+        supabase = get_supabase()
+        if supabase:
             try:
                 result = (
-                    supabase.table("flashcard_sets").insert(flashcard_set).execute()
+                    supabase.table("flashcard_sets").insert(flashcard_sets).execute()
                 )
                 if result.data:
-                    return result.data[0]
-                return FlashcardStorage._save_to_memory(flashcard_set)
+                    bump_cache_version()
+                    return result.data
             except Exception as e:
-                logger.error(f"Supabase save failed: {e}")
-                return FlashcardStorage._save_to_memory(flashcard_set)
-        else:
-            return FlashcardStorage._save_to_memory(flashcard_set)
+                logger.error("Supabase bulk save failed: %s", e)
+        return FlashcardStorage._save_many_to_memory(flashcard_sets)
 
     @staticmethod
     def _save_to_memory(flashcard_set):
-        global storage_counter
-        flashcard_set["id"] = storage_counter
-        flashcard_storage[storage_counter] = flashcard_set
-        storage_counter += 1
-        return flashcard_set
+        return FlashcardStorage._save_many_to_memory([flashcard_set])[0]
+
+    @staticmethod
+    def _save_many_to_memory(flashcard_sets):
+        for flashcard_set in flashcard_sets:
+            set_id = next(flashcard_ids)
+            flashcard_set["id"] = set_id
+            flashcard_storage[set_id] = flashcard_set
+        evict_oldest(flashcard_storage, MAX_MEMORY_SETS, "flashcard sets")
+        # One invalidation for the whole batch instead of one per set
+        bump_cache_version()
+        return flashcard_sets
 
     @staticmethod
-    def get_all_sets(user_email=None, include_locked=False):
-        if USE_SUPABASE and supabase:
+    def get_all_sets(
+        user_email=None,
+        include_locked=False,
+        include_cards=False,
+        limit=None,
+        user_tier=None,
+    ):
+        supabase = get_supabase()
+        if supabase:
             try:
-                result = (
-                    supabase.table("flashcard_sets")
-                    .select(
-                        "id, title, total_cards, created_at, tier_required, user_email"
-                    )
-                    .order("created_at", desc=True)
-                    .execute()
-                )
+                columns = SET_SUMMARY_COLUMNS
+                if include_cards:
+                    columns += ", flashcards"
 
-                if result.data:
-                    sets = result.data
+                if user_tier is None:
                     user_tier = (
                         TierManager.check_user_tier(user_email)
                         if user_email
                         else "free"
                     )
+                # Resolved once up front; the loop below never touches Supabase
+                is_premium = user_tier == "premium"
 
-                    for set_data in sets:
-                        tier_required = set_data.get("tier_required", "free")
+                query = (
+                    supabase.table("flashcard_sets")
+                    .select(columns)
+                    .order("created_at", desc=True)
+                )
+                # Let Postgres drop sets this user cannot open, so every row
+                # returned is kept and the limit can always be pushed down
+                if not (include_locked or is_premium):
+                    query = query.eq("tier_required", "free")
+                if limit:
+                    query = query.limit(limit)
+                result = query.execute()
 
-                        if user_email:
-                            can_access = (tier_required == "free") or (
-                                user_tier == "premium"
-                            )
-                        else:
-                            can_access = tier_required == "free"
+                if result.data:
+                    sets = []
+                    for set_data in result.data:
+                        can_access = (
+                            is_premium
+                            or set_data.get("tier_required", "free") == "free"
+                        )
+                        if not (can_access or include_locked):
+                            continue
 
                         set_data["can_access"] = can_access
                         set_data["is_locked"] = not can_access
                         set_data["user_tier"] = user_tier
-
-                    if not include_locked:
-                        sets = [s for s in sets if s["can_access"]]
+                        sets.append(set_data)
+                        if len(sets) == limit:
+                            break
 
                     return sets
 
                 return []
             except Exception as e:
-                logger.error(f"Supabase fetch failed: {e}")
-                return FlashcardStorage._get_memory_sets()
-        return FlashcardStorage._get_memory_sets()
+                logger.error("Supabase fetch failed: %s", e)
+                return FlashcardStorage._get_memory_sets(include_cards, limit)
+        return FlashcardStorage._get_memory_sets(include_cards, limit)
 
     @staticmethod
-    def _get_memory_sets():
-        return sorted(
-            [
-                {
-                    "id": sid,
-                    "title": s["title"],
-                    "total_cards": s["total_cards"],
-                    "created_at": s["created_at"],
-                    "tier_required": s.get("tier_required", "free"),
-                    "can_access": True,
-                    "is_locked": False,
-                }
-                for sid, s in flashcard_storage.items()
-            ],
-            key=lambda x: x["created_at"],
-            reverse=True,
-        )
+    def _get_memory_sets(include_cards=False, limit=None):
+        # Insertion order is creation order, so the newest sets are a reversed
+        # prefix; no sort needed
+        newest = reversed(flashcard_storage.values())
+        return [
+            {
+                "id": s["id"],
+                "title": s["title"],
+                "total_cards": s["total_cards"],
+                "created_at": s["created_at"],
+                "tier_required": s.get("tier_required", "free"),
+                "can_access": True,
+                "is_locked": False,
+                **({"flashcards": s["flashcards"]} if include_cards else {}),
+            }
+            for s in itertools.islice(newest, limit)
+        ]
 
     @staticmethod
-    def get_set(set_id, user_email=None):
-        if USE_SUPABASE and supabase:
+    def get_set(set_id, user_email=None, include_original=True):
+        supabase = get_supabase()
+        if supabase:
             try:
-                if user_email and not TierManager.can_access_flashcard_set(
-                    user_email, set_id
+                flashcard_set = FlashcardStorage._fetch_set(
+                    set_id, include_original, _cache_version, cache_window()
+                )
+                # The row already carries tier_required, so gate on it directly
+                if (
+                    flashcard_set
+                    and user_email
+                    and flashcard_set.get("tier_required", "free") != "free"
+                    and TierManager.check_user_tier(user_email) != "premium"
                 ):
                     return {"error": "Access denied", "tier_required": "premium"}
-
-                result = (
-                    supabase.table("flashcard_sets")
-                    .select("*")
-                    .eq("id", set_id)
-                    .execute()
-                )
-                if result.data and len(result.data) > 0:
-                    return result.data[0]
-                return None
+                return flashcard_set
             except Exception as e:
-                logger.error(f"Supabase get failed: {e}")
-                return flashcard_storage.get(int(set_id))
-        return flashcard_storage.get(int(set_id))
+                logger.error("Supabase get failed: %s", e)
+                return FlashcardStorage._get_memory_set(set_id, include_original)
+        return FlashcardStorage._get_memory_set(set_id, include_original)
+
+    @staticmethod
+    def _get_memory_set(set_id, include_original=True):
+        flashcard_set = flashcard_storage.get(coerce_id(set_id))
+        if flashcard_set is None or include_original:
+            return flashcard_set
+        return {k: v for k, v in flashcard_set.items() if k != "original_text"}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _fetch_set(set_id, include_original, version, window):
+        columns = SET_DETAIL_COLUMNS
+        if include_original:
+            columns += ", original_text"
+        result = (
+            get_supabase()
+            .table("flashcard_sets")
+            .select(columns)
+            .eq("id", set_id)
+            .execute()
+        )
+        if result.data and len(result.data) > 0:
+            return result.data[0]
+        return None
 
     @staticmethod
     def delete_set(set_id, user_email=None):
-        if USE_SUPABASE and supabase:
+        supabase = get_supabase()
+        if supabase:
+            from postgrest.types import ReturnMethod
+
             try:
-                flashcard_set = (
+                query = (
                     supabase.table("flashcard_sets")
-                    .select("*")
+                    .delete(returning=ReturnMethod.representation)
                     .eq("id", set_id)
-                    .execute()
                 )
-                if not flashcard_set.data:
-                    return None
+                if user_email:
+                    query = query.eq("user_email", user_email)
+                result = query.execute()
 
-                set_data = flashcard_set.data[0]
-                if user_email and set_data.get("user_email") != user_email:
-                    return {"error": "Access denied"}
-
-                supabase.table("flashcard_sets").delete().eq("id", set_id).execute()
-                return set_data
+                if result.data:
+                    bump_cache_version()
+                    # Keep only the summary, not the flashcards/original_text blobs
+                    deleted = result.data[0]
+                    return {
+                        column: deleted.get(column)
+                        for column in SET_SUMMARY_COLUMNS.split(", ")
+                    }
+
+                # Nothing matched: only an owner-scoped delete needs a second
+                # look to tell "not found" from "not yours"
+                if user_email:
+                    existing = (
+                        supabase.table("flashcard_sets")
+                        .select("id")
+                        .eq("id", set_id)
+                        .execute()
+                    )
+                    if existing.data:
+                        return {"error": "Access denied"}
+                return None
             except Exception as e:
-                logger.error(f"Supabase delete failed: {e}")
-                return flashcard_storage.pop(int(set_id), None)
-        return flashcard_storage.pop(int(set_id), None)
+                logger.error("Supabase delete failed: %s", e)
+                return FlashcardStorage._delete_from_memory(set_id)
+        return FlashcardStorage._delete_from_memory(set_id)
+
+    @staticmethod
+    def _delete_from_memory(set_id):
+        deleted = flashcard_storage.pop(coerce_id(set_id), None)
+        if deleted:
+            bump_cache_version()
+        return deleted
 
 
 @app.route("/api/flashcards", methods=["POST"])
 def save_flashcards():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
+    data, error = parse_request(SaveFlashcardsRequest)
+    if error:
+        return error
 
-    title = data.get("title", "").strip()
-    flashcards = data.get("flashcards", [])
-    original_text = data.get("original_text", "")
-    card_statuses = data.get("card_statuses", [])
-    user_email = data.get("user_email")
-    tier_required = data.get("tier_required", "free")
+    title = data.title.strip()
+    flashcards = data.flashcards
+    original_text = data.original_text
+    card_statuses = data.card_statuses
+    user_email = data.user_email
+    tier_required = data.tier_required
 
     if not title or not flashcards:
         return jsonify({"error": "Title and flashcards are required"}), 400
@@ -474,7 +1058,59 @@ def save_flashcards():
             "title": title,
             "total_cards": len(flashcards),
             "tier_required": tier_required,
-            "storage_type": "Supabase" if USE_SUPABASE else "Memory",
+            "storage_type": STORAGE_LABEL,
+        }
+    )
+
+
+@app.route("/api/flashcards/bulk", methods=["POST"])
+def bulk_save_flashcards():
+    data, error = parse_request(BulkSaveFlashcardsRequest)
+    if error:
+        return error
+
+    if not data.sets:
+        return jsonify({"error": "At least one flashcard set is required"}), 400
+
+    if len(data.sets) > MAX_BULK_SETS:
+        return (
+            jsonify({"error": f"At most {MAX_BULK_SETS} sets can be saved at once"}),
+            400,
+        )
+
+    user_tiers = {}
+    flashcard_sets = []
+    for set_data in data.sets:
+        title = set_data.title.strip()
+        if not title or not set_data.flashcards:
+            return jsonify({"error": "Title and flashcards are required"}), 400
+
+        user_email = set_data.user_email
+        if set_data.tier_required == "premium" and user_email:
+            if user_email not in user_tiers:
+                user_tiers[user_email] = TierManager.check_user_tier(user_email)
+            if user_tiers[user_email] != "premium":
+                return jsonify({"error": "Premium subscription required"}), 403
+
+        flashcard_sets.append(
+            FlashcardStorage.build_flashcard_set(
+                title,
+                set_data.flashcards,
+                set_data.original_text,
+                set_data.card_statuses,
+                user_email,
+                set_data.tier_required,
+            )
+        )
+
+    saved_sets = FlashcardStorage.save_many(flashcard_sets)
+
+    return jsonify(
+        {
+            "message": "Flashcard sets saved successfully",
+            "ids": [s["id"] for s in saved_sets],
+            "total_sets": len(saved_sets),
+            "storage_type": STORAGE_LABEL,
         }
     )
 
@@ -484,9 +1120,56 @@ def get_flashcard_sets():
     user_email = request.args.get("user_email")
     include_locked = request.args.get("include_locked", "false").lower() == "true"
     include_cards = request.args.get("include_cards", "false").lower() == "true"
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = min(limit, MAX_LIST_LIMIT) if limit >= 1 else None
+
+    cache_key = (user_email, include_locked, include_cards, limit)
+    with _cache_lock:
+        version = _cache_version
+        cached = _list_cache.get(cache_key)
+        if cached is not None:
+            if cached[0] == version and time.monotonic() - cached[1] < LIST_CACHE_TTL:
+                _list_cache.move_to_end(cache_key)
+            else:
+                del _list_cache[cache_key]
+                cached = None
+
+    if cached is not None:
+        etag, body = cached[2], cached[3]
+    else:
+        body = app.json.dumps_bytes(
+            _build_flashcard_sets_payload(
+                user_email, include_locked, include_cards, limit
+            )
+        )
+        etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        with _cache_lock:
+            if version == _cache_version:
+                _list_cache[cache_key] = (version, time.monotonic(), etag, body)
+                _list_cache.move_to_end(cache_key)
+                if len(_list_cache) > LIST_CACHE_SIZE:
+                    _list_cache.popitem(last=False)
+
+    if etag_matches(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+
+def _build_flashcard_sets_payload(user_email, include_locked, include_cards, limit):
+    user_tier = TierManager.check_user_tier(user_email) if user_email else "free"
 
     if include_cards:
-        sets_list = FlashcardStorage.get_all_sets(user_email, include_locked=True)
+        sets_list = FlashcardStorage.get_all_sets(
+            user_email,
+            include_locked=True,
+            include_cards=True,
+            limit=limit,
+            user_tier=user_tier,
+        )
 
         for set_data in sets_list:
             if not set_data.get("can_access", True):
@@ -495,26 +1178,25 @@ def get_flashcard_sets():
                     set_data["flashcards"] = flashcards[:1]
                     set_data["preview_only"] = True
     else:
-        sets_list = FlashcardStorage.get_all_sets(user_email, include_locked)
-
-    user_tier = TierManager.check_user_tier(user_email) if user_email else "free"
+        sets_list = FlashcardStorage.get_all_sets(
+            user_email, include_locked, limit=limit, user_tier=user_tier
+        )
 
-    return jsonify(
-        {
-            "flashcard_sets": sets_list,
-            "total_sets": len(sets_list),
-            "user_tier": user_tier,
-            "user_email": user_email,
-            "storage_type": "Supabase" if USE_SUPABASE else "Memory",
-        }
-    )
+    return {
+        "flashcard_sets": sets_list,
+        "total_sets": len(sets_list),
+        "user_tier": user_tier,
+        "user_email": user_email,
+        "storage_type": STORAGE_LABEL,
+    }
 
 
 @app.route("/api/flashcards/<int:set_id>", methods=["GET"])
 def get_flashcard_set(set_id):
     user_email = request.args.get("user_email")
+    include_original = request.args.get("include_original", "true").lower() != "false"
 
-    flashcard_set = FlashcardStorage.get_set(set_id, user_email)
+    flashcard_set = FlashcardStorage.get_set(set_id, user_email, include_original)
     if not flashcard_set:
         return jsonify({"error": "Flashcard set not found"}), 404
 
@@ -545,17 +1227,17 @@ def delete_flashcard_set(set_id):
 
 @app.route("/api/payments/create-intent", methods=["POST"])
 def create_payment_intent():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
-
-    amount = data.get("amount")
-    currency = data.get("currency", "KES")
-    description = data.get("description", "StudyPal Premium")
-    user_email = data.get("user_email")
-    plan_type = data.get("plan_type", "monthly")
-    redirect_url = data.get("redirect_url", request.url_root)
-    cancel_url = data.get("cancel_url", request.url_root)
+    data, error = parse_request(PaymentIntentRequest)
+    if error:
+        return error
+
+    amount = data.amount
+    currency = data.currency
+    description = data.description
+    user_email = data.user_email
+    plan_type = data.plan_type
+    redirect_url = data.redirect_url or request.url_root
+    cancel_url = data.cancel_url or request.url_root
 
     if not amount or amount <= 0:
         return jsonify({"error": "Valid amount is required"}), 400
@@ -564,7 +1246,7 @@ def create_payment_intent():
         return jsonify({"error": "User email is required"}), 400
 
     try:
-        payment_intent = PaymentStorage.create_payment_intent(
+        new_intent = PaymentStorage.build_payment_intent(
             amount=amount,
             currency=currency,
             description=description,
@@ -572,12 +1254,16 @@ def create_payment_intent():
             plan_type=plan_type,
         )
 
-        checkout_url = f"{INTASEND_BASE_URL}/checkout/{payment_intent['reference']}/"
-
+        # Store first: a double-click or retry may reuse a recent pending
+        # intent (or the insert may be re-keyed), and the collection must
+        # carry the stored reference, so IntaSend is called exactly once
+        payment_intent = PaymentStorage.save_payment_intent(new_intent)
         collection_data = create_intasend_collection(
-            payment_intent, user_email, redirect_url, cancel_url
+            payment_intent, user_email, redirect_url, cancel_url, request.url_root
         )
 
+        checkout_url = f"{INTASEND_BASE_URL}/checkout/{payment_intent['reference']}/"
+
         if collection_data and collection_data.get("checkout_url"):
             checkout_url = collection_data["checkout_url"]
 
@@ -594,11 +1280,13 @@ def create_payment_intent():
         )
 
     except Exception as e:
-        logger.error(f"Payment intent creation failed: {e}")
+        logger.error("Payment intent creation failed: %s", e)
         return jsonify({"error": "Failed to create payment intent"}), 500
 
 
-def create_intasend_collection(payment_intent, user_email, redirect_url, cancel_url):
+def create_intasend_collection(
+    payment_intent, user_email, redirect_url, cancel_url, url_root
+):
     try:
         if not INTASEND_SECRET_KEY:
             logger.warning("INTASEND_SECRET_KEY not set, using basic checkout URL")
@@ -619,20 +1307,20 @@ def create_intasend_collection(payment_intent, user_email, redirect_url, cancel_
             "first_name": first_name,
             "last_name": last_name,
             "email": user_email,
-            "host": request.url_root.rstrip("/"),
+            "host": url_root.rstrip("/"),
             "amount": payment_intent["amount"],
             "currency": payment_intent["currency"],
             "api_ref": payment_intent["reference"],
             "narrative": payment_intent["description"],
             "redirect_url": redirect_url,
-            "webhook_url": f"{request.url_root}api/payments/webhook",
+            "webhook_url": f"{url_root}api/payments/webhook",
             "extra": {
                 "plan_type": payment_intent.get("plan_type", "monthly"),
                 "user_email": user_email,
             },
         }
 
-        response = requests.post(
+        response = intasend_session.post(
             f"{INTASEND_BASE_URL}/api/v1/collections/",
             headers=headers,
             json=collection_payload,
@@ -641,75 +1329,81 @@ def create_intasend_collection(payment_intent, user_email, redirect_url, cancel_
 
         if response.status_code == 201:
             collection_data = response.json()
-            logger.info(f"IntaSend collection created: {collection_data.get('id')}")
+            logger.info("IntaSend collection created: %s", collection_data.get("id"))
             return collection_data
         else:
             logger.warning(
-                f"IntaSend collection creation failed: {response.status_code} - {response.text}"
+                "IntaSend collection creation failed: %s - %s",
+                response.status_code,
+                response.text,
             )
             return None
 
     except requests.RequestException as e:
-        logger.error(f"IntaSend API request failed: {e}")
+        logger.error("IntaSend API request failed: %s", e)
         return None
     except Exception as e:
-        logger.error(f"Collection creation failed: {e}")
+        logger.error("Collection creation failed: %s", e)
         return None
 
 
 @app.route("/payment-success")
 def payment_success():
-    return send_from_directory(app.static_folder or "", "index.html")
+    return send_frontend_file("index.html")
 
 
 @app.route("/payment-cancel")
 def payment_cancel():
-    return send_from_directory(app.static_folder or "", "index.html")
+    return send_frontend_file("index.html")
+
+
+WEBHOOK_STATUS_MAPPING = {
+    "COMPLETE": "completed",
+    "COMPLETED": "completed",
+    "SUCCESS": "completed",
+    "PROCESSING": "processing",
+    "PENDING": "pending",
+    "FAILED": "failed",
+    "CANCELLED": "cancelled",
+    "CANCELED": "cancelled",
+}
+# First segment after the prefix, same as reference.split("_")[1]
+WEBHOOK_REFERENCE_RE = re.compile(r"studypal_([^_]*)")
 
 
 @app.route("/api/payments/webhook", methods=["POST"])
 def intasend_webhook():
     try:
-        data = request.get_json()
+        data = read_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        logger.info(f"Webhook received: {data}")
-
         invoice_id = data.get("invoice_id") or data.get("id")
         state = data.get("state") or data.get("status")
         reference = data.get("account") or data.get("api_ref") or data.get("reference")
 
-        if reference and reference.startswith("studypal_"):
-            reference_parts = reference.split("_")
-            if len(reference_parts) >= 2:
-                payment_id = reference_parts[1]
-
-                status_mapping = {
-                    "COMPLETE": "completed",
-                    "COMPLETED": "completed",
-                    "SUCCESS": "completed",
-                    "PROCESSING": "processing",
-                    "PENDING": "pending",
-                    "FAILED": "failed",
-                    "CANCELLED": "cancelled",
-                    "CANCELED": "cancelled",
-                }
+        logger.info("Webhook received: reference=%s state=%s", reference, state)
+        logger.debug("Webhook payload: %s", data)
 
-                status = status_mapping.get(state.upper() if state else "", "unknown")
+        match = WEBHOOK_REFERENCE_RE.match(reference) if reference else None
+        if match:
+            payment_id = match.group(1)
+            status = WEBHOOK_STATUS_MAPPING.get(
+                state.upper() if state else "", "unknown"
+            )
 
-                if status != "unknown":
-                    PaymentStorage.update_payment_status(payment_id, status, invoice_id)
-                    logger.info(f"Payment {payment_id} updated to {status} via webhook")
-                else:
-                    logger.warning(f"Unknown payment status: {state}")
+            if status != "unknown":
+                PaymentStorage.update_payment_status(payment_id, status, invoice_id)
+                logger.info("Payment %s updated to %s via webhook", payment_id, status)
+            else:
+                logger.warning("Unknown payment status: %s", state)
 
         return jsonify(
             {"status": "received", "message": "Webhook processed successfully"}
         )
 
     except Exception as e:
-        logger.error(f"Webhook processing failed: {e}")
+        logger.error("Webhook processing failed: %s", e)
         return jsonify({"error": "Webhook processing failed"}), 500
 
 
@@ -732,9 +1426,12 @@ def get_user_tier():
 
 @app.route("/api/premium/validate", methods=["POST"])
 def validate_premium_access():
-    data = request.get_json()
-    payment_id = data.get("payment_id")
-    user_email = data.get("user_email")
+    data, error = parse_request(PremiumValidationRequest)
+    if error:
+        return error
+
+    payment_id = data.payment_id
+    user_email = data.user_email
 
     if not payment_id or not user_email:
         return jsonify({"error": "Payment ID and email required"}), 400
@@ -744,6 +1441,9 @@ def validate_premium_access():
         return jsonify({"error": "Payment not found"}), 404
 
     is_premium = payment["status"] == "completed"
+    if is_premium:
+        # The webhook that upgraded this user may have landed on another worker
+        _tier_cache.pop(user_email, None)
     user_tier = TierManager.check_user_tier(user_email) if is_premium else "free"
 
     return jsonify(
@@ -756,48 +1456,117 @@ def validate_premium_access():
     )
 
 
+STATIC_ASSET_MAX_AGE = 3600
+
+
+def compute_static_etags(static_folder):
+    etags = {}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            full_path = os.path.join(root, name)
+            rel_path = os.path.relpath(full_path, static_folder).replace(os.sep, "/")
+            with open(full_path, "rb") as f:
+                etags[rel_path] = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    return etags
+
+
+STATIC_ETAGS = compute_static_etags(app.static_folder or "")
+
+
+def send_frontend_file(path):
+    etag = STATIC_ETAGS.get(path)
+    max_age = None if path == "index.html" else STATIC_ASSET_MAX_AGE
+
+    if etag and etag_matches(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        if max_age:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    return send_from_directory(
+        app.static_folder or "", path, etag=etag or True, max_age=max_age
+    )
+
+
+@app.endpoint("static")
+def serve_static(filename):
+    return send_frontend_file(filename)
+
+
 @app.route("/", defaults={"path": ""})
 @app.route("/<path:path>")
 def serve_frontend(path):
-    static_folder = app.static_folder or ""
-    if path != "" and os.path.exists(os.path.join(static_folder, path)):
-        return send_from_directory(static_folder, path)
-    return send_from_directory(static_folder, "index.html")
+    if path != "" and (
+        path in STATIC_ETAGS
+        # Files added while developing are not in the startup snapshot
+        or (app.debug and os.path.exists(os.path.join(app.static_folder or "", path)))
+    ):
+        return send_frontend_file(path)
+    return send_frontend_file("index.html")
+
+
+STATUS_BODY = app.json.dumps_bytes(
+    {
+        "message": "StudyPal Backend is running!",
+        "version": "2.0.0",
+        "storage": STORAGE_LABEL,
+        "ai_enabled": AI_ENABLED,
+        "tier_system": True,
+        "endpoints": {
+            "generate": "/api/generate-flashcards",
+            "save": "/api/flashcards",
+            "bulk_save": "/api/flashcards/bulk",
+            "get": "/api/flashcards",
+            "delete": "/api/flashcards/<id>",
+            "tier": "/api/user/tier",
+            "payment": "/api/payments/create-intent",
+        },
+    }
+)
 
 
 @app.route("/api/status")
 def api_status():
-    return jsonify(
-        {
-            "message": "StudyPal Backend is running!",
-            "version": "2.0.0",
-            "storage": "Supabase" if USE_SUPABASE else "Memory",
-            "ai_enabled": bool(os.getenv("GEMINI_API_KEY")),
-            "tier_system": True,
-            "endpoints": {
-                "generate": "/api/generate-flashcards",
-                "save": "/api/flashcards",
-                "get": "/api/flashcards",
-                "delete": "/api/flashcards/<id>",
-                "tier": "/api/user/tier",
-                "payment": "/api/payments/create-intent",
-            },
-        }
-    )
+    return Response(STATUS_BODY, mimetype="application/json")
+
+
+ERROR_TEXT_TOO_SHORT = app.json.dumps_bytes(
+    {"error": "Text too short, provide at least 20 characters"}
+)
+ERROR_TEXT_TOO_LONG = app.json.dumps_bytes(
+    {"error": f"Text too long, provide at most {MAX_TEXT_CHARS} characters"}
+)
+ERROR_GENERATION_FAILED = app.json.dumps_bytes(
+    {"error": "Unable to generate flashcards"}
+)
+
+
+def json_error(body, status):
+    return Response(body, status=status, mimetype="application/json")
 
 
 @app.route("/api/generate-flashcards", methods=["POST"])
 def generate_flashcards():
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
+    data, error = parse_request(GenerateFlashcardsRequest)
+    if error:
+        return error
 
-    text = data.get("text", "").strip()
-    num_cards = data.get("num_cards", 5)
-    user_email = data.get("user_email")
+    raw_text = data.text
+    if len(raw_text) < 20:
+        return json_error(ERROR_TEXT_TOO_SHORT, 400)
+    if len(raw_text) > MAX_TEXT_CHARS:
+        return json_error(ERROR_TEXT_TOO_LONG, 413)
 
-    if not text or len(text) < 20:
-        return jsonify({"error": "Text too short, provide at least 20 characters"}), 400
+    text = raw_text.strip()
+    num_cards = data.num_cards
+    user_email = data.user_email
+
+    if len(text) < 20:
+        return json_error(ERROR_TEXT_TOO_SHORT, 400)
 
     user_tier = TierManager.check_user_tier(user_email) if user_email else "free"
     max_cards = 10 if user_tier == "premium" else 5
@@ -808,10 +1577,9 @@ def generate_flashcards():
             400,
         )
 
-    generator = FlashcardGenerator(text)
-    flashcards = generator.generate_flashcards(num_cards)
+    flashcards = generate_flashcards_cached(text, num_cards)
     if not flashcards:
-        return jsonify({"error": "Unable to generate flashcards"}), 400
+        return json_error(ERROR_GENERATION_FAILED, 400)
 
     return jsonify(
         {
@@ -820,7 +1588,7 @@ def generate_flashcards():
             "source_text_length": len(text),
             "user_tier": user_tier,
             "max_cards_allowed": max_cards,
-            "generated_at": datetime.now().isoformat(),
+            "generated_at": now_iso(),
         }
     )
 
@@ -843,17 +1611,28 @@ def get_payment_status(payment_id):
     )
 
 
+HEALTH_FIELDS = {
+    "storage": STORAGE_LABEL,
+    "ai_enabled": AI_ENABLED,
+    "tier_system": True,
+}
+
+
+# (timestamp, body): the body only changes when now_iso() ticks over
+_health_body = ["", b""]
+
+
 @app.route("/api/health")
 def health_check():
-    return jsonify(
-        {
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "storage": "Supabase" if USE_SUPABASE else "Memory",
-            "ai_enabled": bool(os.getenv("GEMINI_API_KEY")),
-            "tier_system": True,
-        }
-    )
+    timestamp = now_iso()
+    if timestamp != _health_body[0]:
+        _health_body[:] = [
+            timestamp,
+            app.json.dumps_bytes(
+                {"status": "healthy", "timestamp": timestamp, **HEALTH_FIELDS}
+            ),
+        ]
+    return Response(_health_body[1], mimetype="application/json")
 
 
 @app.errorhandler(404)
@@ -866,5 +1645,18 @@ def handle_405(error):
     return jsonify({"error": "Method not allowed"}), 405
 
 
+@app.errorhandler(413)
+def handle_413(error):
+    return jsonify({"error": "Request body too large"}), 413
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    try:
+        from gevent.pywsgi import WSGIServer
+    except ImportError:
+        debug = os.getenv("FLASK_DEBUG") == "1"
+        app.run(debug=debug, use_reloader=debug)
+    else:
+        port = int(os.getenv("PORT", 5000))
+        logger.info("Serving with gevent on port %s", port)
+        WSGIServer(("0.0.0.0", port), app).serve_forever()
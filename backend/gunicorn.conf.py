@@ -0,0 +1,15 @@
+import os
+
+# Patch before the app (and its Supabase/httpx clients) is preloaded in the master
+from gevent import monkey
+
+monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gevent"
+# Handlers mostly wait on Supabase/Gemini/IntaSend, so each worker can park many
+# greenlets; excess Supabase calls queue on the client's connection pool
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+preload_app = True
+timeout = 60
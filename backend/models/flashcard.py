@@ -1,51 +1,260 @@
 import os
 import re
-import json
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import requests
-from typing import List, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# (connect, read) per attempt; the read matches the baseline 30s for a
+# single-material, 2048-token prompt. With one gateway-error retry and no read
+# retries the worst case (~66s) stays inside GenerationBatcher's 70s wait
+GEMINI_TIMEOUT = (5, 30)
+
+_ABBREVIATION_RE = re.compile(r"\b(?:Dr|Mr|Ms|Mrs|Prof|Inc|Ltd|etc|vs|e\.g|i\.e)\.")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+_WHITESPACE_RE = re.compile(r"\s+")
+_JSON_STRUCTURE_RE = re.compile(r'["{}\[\]]')
+_JSON_STRING_END_RE = re.compile(r'\\.|"', re.DOTALL)
+_JSON_CLOSERS = {"{": "}", "[": "]"}
+_TECHNICAL_SUFFIX_RE = re.compile(
+    r"\b\w*(?:tion|ism|ology|ment|ity|ness)\b", re.IGNORECASE
+)
+# One scan for every difficulty signal; concept words come first because
+# "mechanism" is also a suffix hit and must count for both
+_DIFFICULTY_RE = re.compile(
+    r"(?P<concept>\b(?:concept|theory|principle|system|process|mechanism)\b)"
+    r"|(?P<suffix>\b\w*(?:tion|ism|ology|ment|ity|ness)\b)"
+    r"|(?P<punct>[,;:])",
+    re.IGNORECASE,
+)
+# Substring scanners (no word boundaries, matching the old ``in q.lower()`` checks)
+_ANALYTICAL_CUE_RE = re.compile("how|why|analyze|compare", re.IGNORECASE)
+_QUESTION_WORD_RE = re.compile("what|how|why|when|where|which|who", re.IGNORECASE)
+_STOPWORD_RE = re.compile(r"\b(?:what|is|the|a|an|how|does|do|are)\b")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+# The ASCII bytes _PUNCTUATION_RE would remove, for bytes.translate
+_ASCII_PUNCTUATION = bytes(c for c in range(128) if _PUNCTUATION_RE.match(chr(c)))
+
+
+@functools.lru_cache(maxsize=1)
+def _gemini_config() -> Tuple[Optional[str], str]:
+    """Read the Gemini key once (after the app has loaded .env) and build the URL."""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        logger.warning("GEMINI_API_KEY not found; using pattern-based generation only.")
+    url = (
+        f"https://generativelanguage.googleapis.com/v1beta/models/"
+        f"gemini-1.5-flash-latest:generateContent?key={api_key}"
+    )
+    return api_key, url
+
+
+def _extract_json_object(text: str, key: str) -> Optional[Dict[str, Any]]:
+    """Return the first top-level JSON object in ``text`` containing ``key``.
+
+    Walks brace depth once (skipping string contents) instead of running
+    DOTALL regexes over the whole response, so fenced and bare JSON are
+    handled alike. If the model was cut off mid-object, everything after
+    the last complete value is dropped and the open brackets are closed.
+    """
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            parsed = orjson.loads(stripped)
+            if isinstance(parsed, dict) and key in parsed:
+                return parsed
+        except orjson.JSONDecodeError:
+            pass
+
+    start = text.find("{")
+    while start != -1:
+        stack: List[str] = []
+        end = safe_end = None
+        safe_depth = 0
+        pos = start
+        while end is None:
+            match = _JSON_STRUCTURE_RE.search(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                while True:
+                    string_end = _JSON_STRING_END_RE.search(text, pos)
+                    if string_end is None:
+                        pos = -1
+                        break
+                    pos = string_end.end()
+                    if string_end.group() == '"':
+                        break
+                if pos == -1:
+                    break
+            elif char in _JSON_CLOSERS:
+                stack.append(char)
+            else:
+                stack.pop()
+                if stack:
+                    safe_end, safe_depth = pos, len(stack)
+                else:
+                    end = pos
+
+        if end is not None:
+            candidate = text[start:end]
+        elif safe_end is not None:
+            candidate = text[start:safe_end] + "".join(
+                _JSON_CLOSERS[c] for c in reversed(stack[:safe_depth])
+            )
+        else:
+            return None
+        try:
+            parsed = orjson.loads(candidate)
+            if isinstance(parsed, dict) and key in parsed:
+                return parsed
+        except orjson.JSONDecodeError:
+            pass
+        if end is None:
+            return None
+        start = text.find("{", end)
+    return None
+
+
+def _build_gemini_session() -> requests.Session:
+    """Keep-alive session for Gemini.
+
+    Only failed connects and one 502/503/504 are retried. A read timeout is
+    not, since the prompt was already sent and would be generated and
+    billed again.
+    """
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=2,
+                read=0,
+                status=1,
+                backoff_factor=0.2,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=None,
+                raise_on_status=False,
+            ),
+        ),
+    )
+    return session
+
+
+_gemini_session = _build_gemini_session()
+
+
+def _reset_gemini_session() -> None:
+    # Forked workers and generation processes must not share pooled sockets
+    global _gemini_session
+    _gemini_session = _build_gemini_session()
+
+
+os.register_at_fork(after_in_child=_reset_gemini_session)
+
 
 class FlashcardGenerator:
     """Flashcard generator using Google Gemini API with pattern-based fallbacks."""
 
     def __init__(self, text: str):
         self.text = text.strip()
-        self.sentences = self._split_into_sentences()
-        self.paragraphs = self._split_into_paragraphs()
-        self.gemini_api_key = os.getenv("GEMINI_API_KEY")
-        self.gemini_url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
-            f"gemini-1.5-flash-latest:generateContent?key={self.gemini_api_key}"
-        )
-        self.headers = {"Content-Type": "application/json"}
-
-        if not self.gemini_api_key:
-            logger.warning(
-                "GEMINI_API_KEY not found; using pattern-based generation only."
-            )
+        self.gemini_api_key, self.gemini_url = _gemini_config()
 
-    def _split_into_sentences(self) -> List[str]:
+    @functools.cached_property
+    def sentences(self) -> List[str]:
         """Split text into meaningful sentences."""
-        text = re.sub(
-            r"\b(?:Dr|Mr|Ms|Mrs|Prof|Inc|Ltd|etc|vs|e\.g|i\.e)\.",
+        text = _ABBREVIATION_RE.sub(
             lambda m: m.group().replace(".", "●"),
             self.text,
         )
-        sentences = re.split(r"(?<=[.!?])\s+(?=[A-Z])", text)
+        sentences = _SENTENCE_SPLIT_RE.split(text)
         return [
-            re.sub(r"\s+", " ", s.replace("●", ".").strip())
+            _WHITESPACE_RE.sub(" ", s.replace("●", ".").strip())
             for s in sentences
             if len(s.strip()) > 25 and len(s.split()) >= 5
         ]
 
-    def _split_into_paragraphs(self) -> List[str]:
+    @functools.cached_property
+    def paragraphs(self) -> List[str]:
         """Split text into paragraphs for context."""
         paragraphs = [p.strip() for p in self.text.split("\n\n") if p.strip()]
         return paragraphs or [self.text]
 
+    def _build_generation_config(self) -> Dict[str, Any]:
+        return {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 2048,
+        }
+
+    def _post_gemini_prompt(self, prompt: str) -> str:
+        """Send a prompt to Gemini and return the first candidate's text."""
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": self._build_generation_config(),
+            "safetySettings": [
+                {"category": c, "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+                for c in [
+                    "HARM_CATEGORY_HARASSMENT",
+                    "HARM_CATEGORY_HATE_SPEECH",
+                    "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    "HARM_CATEGORY_DANGEROUS_CONTENT",
+                ]
+            ],
+        }
+        response = _gemini_session.post(
+            self.gemini_url, data=orjson.dumps(payload), timeout=GEMINI_TIMEOUT
+        )
+        response.raise_for_status()
+        result = orjson.loads(response.content)
+        return (
+            result.get("candidates", [{}])[0]
+            .get("content", {})
+            .get("parts", [{}])[0]
+            .get("text", "")
+        )
+
+    def _format_gemini_cards(
+        self, flashcards: List[Dict[str, str]], num_cards: int
+    ) -> List[Dict[str, Any]]:
+        # Model output: skip anything that isn't a list of string question/answer dicts
+        if not isinstance(flashcards, list):
+            return []
+        cards = []
+        for i, fc in enumerate(flashcards[:num_cards]):
+            if not isinstance(fc, dict):
+                continue
+            question, answer = fc.get("question"), fc.get("answer")
+            if not isinstance(question, str) or not isinstance(answer, str):
+                continue
+            question, answer = question.strip(), answer.strip()
+            difficulty = self._score_and_validate(question, answer)
+            if difficulty is None:
+                continue
+            cards.append(
+                {
+                    "id": str(i + 1),
+                    "question": question,
+                    "answer": answer,
+                    "difficulty": difficulty,
+                    "type": "gemini_generated",
+                    "model": "gemini-1.5-flash",
+                }
+            )
+        return cards
+
     def _try_gemini_generation(
         self, content: str, num_cards: int
     ) -> List[Dict[str, Any]]:
@@ -68,143 +277,135 @@ Requirements:
 Respond ONLY with valid JSON:
 {{ "flashcards": [{{ "question": "Q?", "answer": "A." }}] }}
 """
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 2048,
-            },
-            "safetySettings": [
-                {"category": c, "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
-                for c in [
-                    "HARM_CATEGORY_HARASSMENT",
-                    "HARM_CATEGORY_HATE_SPEECH",
-                    "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "HARM_CATEGORY_DANGEROUS_CONTENT",
-                ]
-            ],
-        }
-
         try:
-            response = requests.post(
-                self.gemini_url, headers=self.headers, json=payload, timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            candidate_text = (
-                result.get("candidates", [{}])[0]
-                .get("content", {})
-                .get("parts", [{}])[0]
-                .get("text", "")
-            )
+            candidate_text = self._post_gemini_prompt(prompt)
             flashcards = self._parse_gemini_response(candidate_text)
-            return [
-                {
-                    "id": str(i + 1),
-                    "question": fc["question"].strip(),
-                    "answer": fc["answer"].strip(),
-                    "difficulty": self._assess_difficulty(fc["question"], fc["answer"]),
-                    "type": "gemini_generated",
-                    "model": "gemini-1.5-flash",
-                }
-                for i, fc in enumerate(flashcards[:num_cards])
-                if self._is_quality_question(
-                    fc.get("question", ""), fc.get("answer", "")
-                )
-            ]
+            return self._format_gemini_cards(flashcards, num_cards)
         except requests.RequestException as e:
-            logger.error(f"Gemini API request failed: {e}")
+            logger.error("Gemini API request failed: %s", e)
         except Exception as e:
-            logger.error(f"Gemini generation failed: {e}")
+            logger.error("Gemini generation failed: %s", e)
         return []
 
     def _parse_gemini_response(self, text: str) -> List[Dict[str, str]]:
         """Parse JSON flashcards from Gemini response."""
         try:
-            json_match = re.search(
-                r"```json\s*(.*?)\s*```", text, re.DOTALL
-            ) or re.search(r'\{.*"flashcards".*\}', text, re.DOTALL)
-            parsed = json.loads(
-                json_match.group(
-                    1 if json_match.re.pattern.startswith("```json") else 0
-                )
-            )
-            return parsed.get("flashcards", [])
+            parsed = _extract_json_object(text, "flashcards")
+            if parsed is None:
+                logger.error("No flashcards JSON found in Gemini response")
+                return []
+            return parsed["flashcards"]
         except Exception as e:
-            logger.error(f"Failed to parse Gemini response: {e}")
+            logger.error("Failed to parse Gemini response: %s", e)
             return []
 
     def _create_pattern_based_questions(
         self, content: str, num_questions: int
     ) -> List[Dict[str, Any]]:
         """Generate questions via pattern matching."""
-        questions = []
-        while len(questions) < num_questions:
-            questions.append(
-                {
-                    "question": "Sample question?",
-                    "answer": "Sample answer.",
-                    "type": "general_template",
-                }
-            )
-        for i, q in enumerate(questions[:num_questions]):
-            q["id"] = str(i + 1)
-            q["difficulty"] = self._assess_difficulty(q["question"], q["answer"])
-        return questions
+        question, answer = "Sample question?", "Sample answer."
+        difficulty = self._assess_difficulty(question, answer)
+        return [
+            {
+                "question": question,
+                "answer": answer,
+                "type": "general_template",
+                "id": str(i + 1),
+                "difficulty": difficulty,
+            }
+            for i in range(num_questions)
+        ]
 
-    def _assess_difficulty(self, question: str, answer: str) -> str:
+    def _assess_difficulty(
+        self, question: str, answer: str, words: Optional[List[str]] = None
+    ) -> str:
         """Estimate difficulty based on length, complexity, and technical terms."""
         text = f"{question} {answer}"
-        score = sum(
-            [
-                len(text.split()) > 25,
-                len([w for w in text.split() if len(w) > 7]) > 2,
-                len(
-                    re.findall(
-                        r"\b\w*(?:tion|ism|ology|ment|ity|ness)\b", text, re.IGNORECASE
-                    )
-                )
-                > 1,
-                (text.count(",") + text.count(";") + text.count(":")) > 1,
-                len(
-                    re.findall(
-                        r"\b(?:concept|theory|principle|system|process|mechanism)\b",
-                        text,
-                        re.IGNORECASE,
-                    )
-                )
-                > 0,
-                any(
-                    word in question.lower()
-                    for word in ["how", "why", "analyze", "compare"]
-                ),
-            ]
+        if words is None:
+            words = text.split()
+        suffixes = concepts = punctuation = 0
+        for match in _DIFFICULTY_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "punct":
+                punctuation += 1
+            elif kind == "suffix":
+                suffixes += 1
+            else:
+                concepts += 1
+                suffixes += _TECHNICAL_SUFFIX_RE.fullmatch(match.group()) is not None
+        long_words = sum(len(w) > 7 for w in words)
+        score = (
+            (len(words) > 25)
+            + (long_words > 2)
+            + (suffixes > 1)
+            + (punctuation > 1)
+            + (concepts > 0)
+            + (_ANALYTICAL_CUE_RE.search(question) is not None)
         )
         return "easy" if score <= 2 else "medium" if score <= 4 else "hard"
 
+    def _quality_words(self, question: str, answer: str) -> Optional[List[str]]:
+        """Validate question quality, cheapest checks first.
+
+        Returns the card's words for reuse by difficulty scoring, or None if
+        the card is rejected.
+        """
+        if not (
+            10 <= len(question) <= 150
+            and 15 <= len(answer) <= 500
+            and question.endswith("?")
+            and question != answer
+            and _QUESTION_WORD_RE.search(question) is not None
+        ):
+            return None
+        question_words = question.split()
+        answer_words = answer.split()
+        if len(question_words) < 3 or len(answer_words) < 4:
+            return None
+        return question_words + answer_words
+
     def _is_quality_question(self, question: str, answer: str) -> bool:
-        """Validate question quality."""
-        return all(
-            [
-                10 <= len(question) <= 150,
-                15 <= len(answer) <= 500,
-                question.endswith("?"),
-                any(
-                    word in question.lower()
-                    for word in ["what", "how", "why", "when", "where", "which", "who"]
-                ),
-                question != answer,
-                len(question.split()) >= 3,
-                len(answer.split()) >= 4,
-            ]
-        )
+        return self._quality_words(question, answer) is not None
+
+    def _score_and_validate(self, question: str, answer: str) -> Optional[str]:
+        """Return the card's difficulty, or None if it fails the quality check."""
+        words = self._quality_words(question, answer)
+        if words is None:
+            return None
+        return self._assess_difficulty(question, answer, words)
 
     def _normalize_for_comparison(self, text: str) -> str:
         """Normalize text to deduplicate."""
-        text = re.sub(r"\b(?:what|is|the|a|an|how|does|do|are)\b", "", text.lower())
-        return re.sub(r"[^\w\s]", "", text).strip()
+        text = _STOPWORD_RE.sub("", text.lower())
+        if text.isascii():
+            return text.encode().translate(None, _ASCII_PUNCTUATION).decode().strip()
+        return _PUNCTUATION_RE.sub("", text).strip()
+
+    @classmethod
+    def generate_batch(cls, items: List[Tuple[str, int]]) -> List[List[Dict[str, Any]]]:
+        """Generate flashcards for several (text, num_cards) pairs concurrently.
+
+        Each material gets its own Gemini request, so a slow or malformed
+        response only affects its own item; identical items share one run.
+        """
+        unique = list(dict.fromkeys(items))
+        if len(unique) == 1:
+            generated = [cls._generate_one(*unique[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(unique)) as pool:
+                generated = list(
+                    pool.map(lambda item: cls._generate_one(*item), unique)
+                )
+        results = dict(zip(unique, generated))
+        return [results[item] for item in items]
+
+    @classmethod
+    def _generate_one(cls, text: str, num_cards: int) -> List[Dict[str, Any]]:
+        try:
+            return cls(text).generate_flashcards(num_cards)
+        except Exception as e:
+            logger.error("Flashcard generation failed: %s", e)
+            return []
 
     def generate_flashcards(self, num_cards: int = 5) -> List[Dict[str, Any]]:
         """Generate flashcards with AI fallback."""
@@ -213,9 +414,11 @@ Respond ONLY with valid JSON:
 
         all_cards = []
         if self.gemini_api_key:
+            # Already quality-checked by _format_gemini_cards
             all_cards.extend(self._try_gemini_generation(self.text, num_cards))
 
-        remaining = num_cards - len(all_cards)
+        validated = len(all_cards)
+        remaining = num_cards - validated
         if remaining > 0:
             pattern_cards = self._create_pattern_based_questions(self.text, remaining)
             for i, c in enumerate(pattern_cards):
@@ -224,14 +427,17 @@ Respond ONLY with valid JSON:
 
         final_cards = []
         seen = set()
-        for c in all_cards:
-            key = self._normalize_for_comparison(c["question"])
-            if key not in seen and self._is_quality_question(
+        for i, c in enumerate(all_cards):
+            # Rejected candidates never need normalising
+            if i >= validated and not self._is_quality_question(
                 c["question"], c["answer"]
             ):
+                continue
+            key = self._normalize_for_comparison(c["question"])
+            if key not in seen:
                 seen.add(key)
                 final_cards.append(c)
-            if len(final_cards) >= num_cards:
-                break
+                if len(final_cards) >= num_cards:
+                    break
 
         return final_cards
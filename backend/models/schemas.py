@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Optional, Union
+
+import msgspec
+
+
+class GenerateFlashcardsRequest(msgspec.Struct):
+    """Body of POST /api/generate-flashcards."""
+
+    text: str = ""
+    num_cards: int = 5
+    user_email: Optional[str] = None
+
+
+class SaveFlashcardsRequest(msgspec.Struct):
+    """Body of POST /api/flashcards."""
+
+    title: str = ""
+    flashcards: List[Dict[str, Any]] = []
+    original_text: str = ""
+    card_statuses: List[Any] = []
+    user_email: Optional[str] = None
+    tier_required: str = "free"
+
+
+class BulkSaveFlashcardsRequest(msgspec.Struct):
+    """Body of POST /api/flashcards/bulk."""
+
+    sets: List[SaveFlashcardsRequest] = []
+
+
+class PaymentIntentRequest(msgspec.Struct):
+    """Body of POST /api/payments/create-intent."""
+
+    amount: Optional[Union[int, float]] = None
+    currency: str = "KES"
+    description: str = "StudyPal Premium"
+    user_email: Optional[str] = None
+    plan_type: str = "monthly"
+    redirect_url: Optional[str] = None
+    cancel_url: Optional[str] = None
+
+
+class PremiumValidationRequest(msgspec.Struct):
+    """Body of POST /api/premium/validate."""
+
+    payment_id: Optional[Union[int, str]] = None
+    user_email: Optional[str] = None
@@ -97,13 +97,10 @@ def run_backend():
     print("Backend will run on: http://localhost:5000")
 
     try:
-        from dotenv import load_dotenv
-
-        load_dotenv()
         from app import app
 
         app.run(
-            debug=True,
+            debug=os.getenv("FLASK_DEBUG") == "1",
             host="0.0.0.0",
             port=5000,
             use_reloader=False,